@@ -1,16 +1,39 @@
+import asyncio
 import json
+import logging
 import os
-import boto3
+import aioboto3
 import base64
 import re
 import io
 from urllib.parse import urlparse, unquote_plus
-from pathlib import PurePosixPath
+from contextlib import AsyncExitStack
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import PIL
 from PIL import Image, ImageDraw, ImageFont
 
-# --- Clients ---
-s3_client = boto3.client('s3')
-sm_runtime = boto3.client('sagemaker-runtime')
+logger = logging.getLogger()
+_log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# An unknown level name would make setLevel raise at import and fail every invocation
+if isinstance(logging.getLevelName(_log_level), int):
+    logger.setLevel(_log_level)
+else:
+    logger.setLevel(logging.INFO)
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", _log_level)
+
+# libjpeg-turbo + OpenCV fast path (bundled in the Lambda layer); falls back to Pillow if missing
+try:
+    import cv2
+    import numpy as np
+    from turbojpeg import TurboJPEG
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError) as e:
+    logger.warning("PyTurboJPEG/OpenCV unavailable (%s). Using Pillow for annotation.", e)
+    turbo_jpeg = None
+
+# Pillow-SIMD builds report a '.postN' version suffix
+logger.info("Pillow %s (%s build)", PIL.__version__, 'SIMD' if '.post' in PIL.__version__ else 'stock')
 
 # --- Configuration from Environment Variables ---
 ENDPOINT_NAME = os.environ.get('SAGEMAKER_ENDPOINT_NAME')
@@ -18,21 +41,140 @@ OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET') # Bucket for JSON results
 ANNOTATED_BUCKET = os.environ.get('ANNOTATED_BUCKET', OUTPUT_BUCKET) # Bucket for annotated images
 OUTPUT_PREFIX = os.environ.get('OUTPUT_PREFIX', 'inference-results')
 ANNOTATED_PREFIX = os.environ.get('ANNOTATED_PREFIX', 'annotated-frames')
+# Set to 'image/jpeg' once the model's input_fn accepts raw JPEG bodies (no base64 / JSON wrapping)
+SAGEMAKER_CONTENT_TYPE = os.environ.get('SAGEMAKER_CONTENT_TYPE', 'application/json')
+# Set ASYNC_INFERENCE=1 to use a SageMaker async endpoint (its input_fn must accept raw images)
+ASYNC_INFERENCE = os.environ.get('ASYNC_INFERENCE') == '1'
+MAX_BATCH = int(os.environ.get('MAX_BATCH', '16')) # Max frames processed concurrently
+S3_PART_SIZE = 8 * 1024 * 1024 # Frames larger than this are downloaded as parallel byte ranges
+S3_RANGE_CONCURRENCY = 8 # Max concurrent range GETs per frame
+JPEG_QUALITY = 85 # Quality of the annotated JPEG (libjpeg-turbo path)
+
+# --- Clients ---
+# All S3 / SageMaker I/O runs on one event loop per container. The async clients are created
+# on first use and kept for the container's lifetime, so warm invocations reuse connections.
+# Pools are sized so requests don't queue for a connection (each of the MAX_BATCH in-flight
+# records may run S3_RANGE_CONCURRENCY range GETs).
+_client_config = Config(
+    max_pool_connections=MAX_BATCH,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+_s3_config = _client_config.merge(Config(max_pool_connections=MAX_BATCH * S3_RANGE_CONCURRENCY))
+session = aioboto3.Session()
+_loop = asyncio.new_event_loop()
+_clients = None # (s3, sagemaker-runtime), see get_clients()
+
+_FRAME_NUMBER_RE = re.compile(r'(\d+)')
+
+# --- Annotation styling (loaded once per container) ---
+_DEFAULT_FONT = ImageFont.load_default()
+# Label substring -> (Pillow color, BGR color); the first matching key wins
+_LABEL_COLORS = {"helmet": ("yellow", (0, 255, 255)), "suit": ("orange", (0, 165, 255))}
+_DEFAULT_COLOR = ("red", (0, 0, 255))
+_COLOR_KEYS = tuple(_LABEL_COLORS)
+_PALETTE_BGR = [_DEFAULT_COLOR[1]] + [_LABEL_COLORS[key][1] for key in _COLOR_KEYS] # Aligned with _COLOR_KEYS, offset by the default
 
 def extract_frame_number(frame_file: str) -> int:
     """
     Extracts the first sequence of digits from a filename.
     """
-    try:
-        match = re.search(r'(\d+)', frame_file)
-        if match:
-            return int(match.group(1))
+    match = _FRAME_NUMBER_RE.search(frame_file)
+    if match:
+        return int(match.group(1))
+    logger.warning("No digits found in %s. Defaulting to 0.", frame_file)
+    return 0
+
+def draw_boxes_turbo(image_bytes, detections):
+    """
+    Draws bounding boxes and labels with OpenCV on a frame decoded by libjpeg-turbo.
+    Boxes, colors and label texts are prepared up front so the draw loop only issues cv2 calls.
+    Returns the image as bytes in JPEG format.
+    """
+    image = turbo_jpeg.decode(image_bytes) # BGR numpy array
+
+    valid = []
+    for det in detections:
+        box = det.get('bbox')
+        if not box or len(box) != 4:
+            logger.warning("Skipping detection with invalid box (box: %s): %s", box, det)
+            continue
+        valid.append(det)
+
+    if valid:
+        boxes = np.asarray([det['bbox'] for det in valid], dtype=np.float64).astype(np.int32)
+        labels = np.asarray([str(det.get('label', 'unknown')) for det in valid])
+
+        # Color index per detection: 0 (default) unless the label contains a _COLOR_KEYS entry (first match wins)
+        color_idx = np.zeros(len(valid), dtype=np.intp)
+        for i, key in enumerate(_COLOR_KEYS, start=1):
+            color_idx = np.where((color_idx == 0) & (np.char.find(labels, key) >= 0), i, color_idx)
+        colors = [_PALETTE_BGR[i] for i in color_idx.tolist()]
+
+        texts = [f"{label} ({(det.get('confidence', 0) * 100):.1f}%)" for label, det in zip(labels.tolist(), valid)]
+
+        for (x1, y1, x2, y2), color, text in zip(boxes.tolist(), colors, texts):
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, 3)
+
+            # Draw label background, then the label on top of it
+            (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+            text_top = max(0, y1 - 2)
+            cv2.rectangle(image, (x1, text_top), (x1 + text_w + 4, text_top + text_h + baseline + 2), color, cv2.FILLED)
+            cv2.putText(image, text, (x1 + 2, text_top + text_h + 1), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+
+    return turbo_jpeg.encode(image, quality=JPEG_QUALITY)
+
+def draw_boxes_pil(image_bytes, detections):
+    """
+    Pillow fallback for draw_boxes, used when libjpeg-turbo / OpenCV are not available
+    or the frame is not a JPEG.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    draw = ImageDraw.Draw(image)
+    font = _DEFAULT_FONT
+
+    for det in detections:
+        # --- THIS IS THE FIX ---
+        # The model sends 'bbox', not 'box'
+        box = det.get('bbox') 
+        # --- END OF FIX ---
+        
+        label = det.get('label', 'unknown') # <-- Use 'label' from the log
+        confidence = det.get('confidence', 0)
+        
+        if not box or len(box) != 4:
+            logger.warning("Skipping detection with invalid box (box: %s): %s", box, det)
+            continue
+
+        # Define color, red if the label matches nothing
+        color = next((pil_color for key, (pil_color, _) in _LABEL_COLORS.items() if key in label), _DEFAULT_COLOR[0])
+
+        # Draw rectangle
+        draw.rectangle(box, outline=color, width=3)
+        
+        # Draw label background
+        text = f"{label} ({(confidence * 100):.1f}%)"
+        
+        # Check if textbbox method is available, fallback if not
+        if hasattr(draw, 'textbbox'):
+          text_bbox = draw.textbbox((box[0], box[1]), text, font=font)
+          text_bbox_list = [text_bbox[0], text_bbox[1], text_bbox[2], text_bbox[3]]
         else:
-            print(f"Warning: No digits found in {frame_file}. Defaulting to 0.")
-            return 0
-    except Exception as e:
-        print(f"Warning: Could not parse frame number from {frame_file} due to {e}. Defaulting to 0.")
-        return 0
+          # Fallback for older Pillow versions
+          text_size = font.getsize(text)
+          text_bbox_list = [box[0], box[1], box[0] + text_size[0], box[1] + text_size[1]]
+
+        # Add small padding
+        text_bbox_list[1] = max(0, text_bbox_list[1] - 2) # Move text up
+        text_bbox_list[2] += 4 # Padding right
+        text_bbox_list[3] += 2 # Padding bottom
+        
+        draw.rectangle(text_bbox_list, fill=color)
+        draw.text((box[0] + 2, text_bbox_list[1]), text, fill="black", font=font)
+
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format="JPEG")
+    return output_buffer.getvalue()
 
 def draw_boxes(image_bytes, detections):
     """
@@ -40,173 +182,274 @@ def draw_boxes(image_bytes, detections):
     Returns the image as bytes in JPEG format.
     """
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        draw = ImageDraw.Draw(image)
-        font = ImageFont.load_default()
-
-        for det in detections:
-            # --- THIS IS THE FIX ---
-            # The model sends 'bbox', not 'box'
-            box = det.get('bbox') 
-            # --- END OF FIX ---
-            
-            label = det.get('label', 'unknown') # <-- Use 'label' from the log
-            confidence = det.get('confidence', 0)
-            
-            if not box or len(box) != 4:
-                print(f"Skipping detection with invalid box (box: {box}): {det}")
-                continue
-
-            # Define color
-            color = "red"
-            if "helmet" in label:
-                color = "yellow"
-            elif "suit" in label:
-                color = "orange"
-
-            # Draw rectangle
-            draw.rectangle(box, outline=color, width=3)
-            
-            # Draw label background
-            text = f"{label} ({(confidence * 100):.1f}%)"
-            
-            # Check if textbbox method is available, fallback if not
-            if hasattr(draw, 'textbbox'):
-              text_bbox = draw.textbbox((box[0], box[1]), text, font=font)
-              text_bbox_list = [text_bbox[0], text_bbox[1], text_bbox[2], text_bbox[3]]
-            else:
-              # Fallback for older Pillow versions
-              text_size = font.getsize(text)
-              text_bbox_list = [box[0], box[1], box[0] + text_size[0], box[1] + text_size[1]]
-
-            # Add small padding
-            text_bbox_list[1] = max(0, text_bbox_list[1] - 2) # Move text up
-            text_bbox_list[2] += 4 # Padding right
-            text_bbox_list[3] += 2 # Padding bottom
-            
-            draw.rectangle(text_bbox_list, fill=color)
-            draw.text((box[0] + 2, text_bbox_list[1]), text, fill="black", font=font)
-
-        output_buffer = io.BytesIO()
-        image.save(output_buffer, format="JPEG")
-        return output_buffer.getvalue()
+        # libjpeg-turbo only decodes JPEG; anything else (e.g. PNG frames) goes through Pillow
+        if turbo_jpeg is not None and image_bytes[:2] == b'\xff\xd8':
+            return draw_boxes_turbo(image_bytes, detections)
+        return draw_boxes_pil(image_bytes, detections)
 
     except Exception as e:
-        print(f"Error drawing boxes: {e}")
+        logger.error("Error drawing boxes: %s", e)
         return image_bytes
 
+async def get_clients():
+    """
+    Returns the container-wide async (s3, sagemaker-runtime) clients, creating them on first use.
+    """
+    global _clients
+    if _clients is None:
+        stack = AsyncExitStack() # Never closed: the clients live as long as the container
+        s3 = await stack.enter_async_context(session.client('s3', config=_s3_config))
+        sm = await stack.enter_async_context(session.client('sagemaker-runtime', config=_client_config))
+        _clients = (s3, sm)
+    return _clients
+
+def split_s3_uri(s3_uri):
+    """
+    Splits an S3 URI (s3://bucket/key) into bucket and key.
+    """
+    parsed_uri = urlparse(s3_uri)
+    bucket = parsed_uri.netloc
+    key = unquote_plus(parsed_uri.path.lstrip('/'))
+
+    if not bucket or not key:
+        raise ValueError(f"Invalid S3 URI: {s3_uri}")
+    return bucket, key
+
+def split_s3_location(s3_location):
+    """
+    Splits a raw S3 location (s3://bucket/key) into bucket and key without URL-decoding the key.
+    Used for the async inference notification, whose locations carry unencoded keys.
+    """
+    scheme, _, path = s3_location.partition('://')
+    bucket, _, key = path.partition('/')
+
+    if scheme != 's3' or not bucket or not key:
+        raise ValueError(f"Invalid S3 location: {s3_location}")
+    return bucket, key
+
+async def s3_get_parallel(s3, bucket, key, part_size=S3_PART_SIZE, max_concurrency=S3_RANGE_CONCURRENCY):
+    """
+    Downloads an S3 object, fetching objects larger than part_size as concurrent byte ranges.
+    The first range GET also reports the object size, so small objects still cost a single request.
+    Returns the object content as a bytes-like object.
+    """
+    try:
+        first = await s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{part_size - 1}")
+    except ClientError as e:
+        # Range requests on an empty object fail with 416
+        if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+            return b''
+        raise
+
+    first_part = await first['Body'].read()
+    content_length = int(first['ContentRange'].rsplit('/', 1)[1]) if 'ContentRange' in first else len(first_part)
+    if content_length <= part_size:
+        return first_part
+
+    buffer = bytearray(content_length)
+    buffer[:len(first_part)] = first_part
+    etag = first.get('ETag')
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_part(start):
+        end = min(start + part_size, content_length) - 1
+        # IfMatch guards against the object being replaced between range requests
+        range_kwargs = {'IfMatch': etag} if etag else {}
+        async with limit:
+            part = await s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", **range_kwargs)
+            buffer[start:end + 1] = await part['Body'].read()
+
+    await asyncio.gather(*(fetch_part(start) for start in range(part_size, content_length, part_size)))
+    return buffer
+
+def parse_frame_message(record):
+    """
+    Parses an SQS record into a dict describing the frame (without downloading it).
+    """
+    message_body = json.loads(record['body'])
+    frame_s3_path = message_body['s3_uri']
+    original_video_key = message_body.get('original_video_key', 'unknown-video')
+    frame_file = message_body.get('frame_file', 'unknown-frame.jpg')
+
+    logger.debug("Processing: %s from %s", frame_file, os.path.basename(original_video_key))
+
+    bucket, key = split_s3_uri(frame_s3_path)
+
+    return {
+        'frame_file': frame_file,
+        'original_video_key': original_video_key,
+        'bucket': bucket,
+        'key': key
+    }
+
+async def fetch_frame(s3, record):
+    """
+    Parses an SQS record and downloads the referenced frame from S3.
+    Returns a dict describing the frame, including its raw image bytes.
+    """
+    frame = parse_frame_message(record)
+
+    logger.debug("  → Downloading image: s3://%s/%s", frame['bucket'], frame['key'])
+    frame['image_bytes'] = await s3_get_parallel(s3, frame['bucket'], frame['key'])
+    return frame
+
+async def invoke_endpoint(sm, image_bytes):
+    """
+    Sends a single frame to the SageMaker endpoint and returns the parsed results.
+    With SAGEMAKER_CONTENT_TYPE=image/jpeg the raw JPEG is sent as-is; otherwise
+    it is wrapped as base64 in a JSON body.
+    """
+    if SAGEMAKER_CONTENT_TYPE == 'application/json':
+        sm_payload = json.dumps({"image": base64.b64encode(image_bytes).decode('utf-8')})
+    else:
+        sm_payload = image_bytes
+
+    sm_response = await sm.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType=SAGEMAKER_CONTENT_TYPE,
+        Body=sm_payload
+    )
+
+    result_body = (await sm_response['Body'].read()).decode('utf-8')
+    return json.loads(result_body)
+
+async def invoke_endpoint_async(sm, frame):
+    """
+    Queues a frame on the SageMaker asynchronous endpoint, which reads it straight from S3.
+    Results are picked up by annotation_handler once the endpoint reports success.
+    """
+    content_type = 'image/png' if frame['key'].lower().endswith('.png') else 'image/jpeg'
+
+    sm_response = await sm.invoke_endpoint_async(
+        EndpointName=ENDPOINT_NAME,
+        # Raw key: SageMaker reads the object from this location as-is
+        InputLocation=f"s3://{frame['bucket']}/{frame['key']}",
+        ContentType=content_type
+    )
+    logger.debug("  → Queued async inference for %s: %s", frame['frame_file'], sm_response['OutputLocation'])
+
+async def save_results(s3, frame, detection_results):
+    """
+    Draws the detections on the frame and saves the annotated image and JSON results.
+    frame['image_bytes'] is only read when there are detections to draw.
+    """
+    frame_file = frame['frame_file']
+    original_video_key = frame['original_video_key']
+
+    logger.debug("  → SM Raw Detections for %s: %s", frame_file, detection_results)
+
+    detections = detection_results.get('detections', [])
+    logger.debug("  → Received %d detection(s)", len(detections))
+
+    original_video_name = os.path.basename(original_video_key)
+    # Ensure ANNOTATED_PREFIX is clean
+    clean_annotated_prefix = ANNOTATED_PREFIX.strip('/')
+
+    annotated_key = '/'.join(p for p in (clean_annotated_prefix, original_video_name, frame_file) if p)
+
+    if detections:
+        # CPU-bound: run on the default thread pool so the event loop keeps serving other records
+        annotated_image_bytes = await asyncio.get_running_loop().run_in_executor(
+            None, draw_boxes, frame['image_bytes'], detections
+        )
+        await s3.put_object(
+            Body=annotated_image_bytes,
+            Bucket=ANNOTATED_BUCKET,
+            Key=annotated_key,
+            ContentType='image/jpeg'
+        )
+    else:
+        # Nothing to draw: server-side copy of the original frame, no decode/encode
+        await s3.copy_object(
+            CopySource={'Bucket': frame['bucket'], 'Key': frame['key']},
+            Bucket=ANNOTATED_BUCKET,
+            Key=annotated_key
+        )
+    annotated_s3_uri = f"s3://{ANNOTATED_BUCKET}/{annotated_key}"
+    logger.debug("  → Saved annotated image to: %s", annotated_s3_uri)
+
+    frame_number = extract_frame_number(frame_file)
+
+    full_response_payload = {
+        "frame_id": f"{original_video_name}_frame_{frame_number:05d}",
+        "video_id": original_video_name,
+        "frame_number": frame_number,
+        "detections": detections,
+        "processed_frame_url": "N/A (Processed by SageMaker)",
+        "annotated_frame_s3_uri": annotated_s3_uri,
+        "outlier_detected": False,
+        "outlier_reason": None
+    }
+
+    frame_json = os.path.splitext(frame_file)[0] + '.json'
+
+    clean_output_prefix = OUTPUT_PREFIX.strip('/')
+    result_key = '/'.join(p for p in (clean_output_prefix, original_video_name, frame_json) if p)
+
+    await s3.put_object(
+        Body=json.dumps(full_response_payload),
+        Bucket=OUTPUT_BUCKET,
+        Key=result_key,
+        ContentType='application/json'
+    )
+
+    logger.debug("  ✓ Saved JSON to: s3://%s/%s", OUTPUT_BUCKET, result_key)
+
+async def process_record(record, s3, sm):
+    """
+    Runs the full pipeline for a single SQS record: download, inference, annotate, save.
+    With ASYNC_INFERENCE the frame is only queued on the endpoint; annotation_handler does the rest.
+    """
+    if ASYNC_INFERENCE:
+        await invoke_endpoint_async(sm, parse_frame_message(record))
+        return
+
+    frame = await fetch_frame(s3, record)
+    try:
+        logger.debug("  → Calling SageMaker endpoint for %s...", frame['frame_file'])
+        detection_results = await invoke_endpoint(sm, frame['image_bytes'])
+        await save_results(s3, frame, detection_results)
+    except Exception as e:
+        raise RuntimeError(f"{frame['frame_file']} from {frame['original_video_key']}: {str(e)}") from e
+
+async def _amain(records):
+    """
+    Processes all SQS records concurrently on the event loop, at most MAX_BATCH at a time.
+    Returns the SQS batchItemFailures entries for records that failed.
+    """
+    s3, sm = await get_clients()
+    limit = asyncio.Semaphore(MAX_BATCH)
+
+    async def run(record):
+        async with limit:
+            await process_record(record, s3, sm)
+
+    results = await asyncio.gather(*(run(record) for record in records), return_exceptions=True)
+
+    failed_messages = []
+    for record, result in zip(records, results):
+        # BaseException also covers asyncio.CancelledError
+        if isinstance(result, BaseException):
+            logger.error("✗ ERROR processing message %s: %s", record['messageId'], result)
+            failed_messages.append({'itemIdentifier': record['messageId']})
+    return failed_messages
+
 def lambda_handler(event, context):
     """
     Process frames from SQS, run inference, draw boxes, and save results.
+    Records are independent, so up to MAX_BATCH of them are in flight at once on the
+    container's event loop, sharing one async S3 / SageMaker client.
     """
     if not ENDPOINT_NAME or not OUTPUT_BUCKET:
         raise ValueError("Missing env vars: SAGEMAKER_ENDPOINT_NAME and/or OUTPUT_BUCKET")
     
-    print(f"Received {len(event['Records'])} records from SQS.")
-    
-    failed_messages = []
-    processed_count = 0
+    records = event['Records']
+    logger.info("Received %d records from SQS.", len(records))
     
-    for record in event['Records']:
-        frame_file = "unknown"
-        original_video_key = "unknown-video"
-        
-        try:
-            message_body = json.loads(record['body'])
-            frame_s3_path = message_body['s3_uri']
-            original_video_key = message_body.get('original_video_key', 'unknown-video')
-            frame_file = message_body.get('frame_file', 'unknown-frame.jpg')
-            
-            print(f"Processing: {frame_file} from {os.path.basename(original_video_key)}")
-            
-            parsed_uri = urlparse(frame_s3_path)
-            bucket = parsed_uri.netloc
-            key = unquote_plus(parsed_uri.path.lstrip('/'))
-            
-            if not bucket or not key:
-                raise ValueError(f"Invalid S3 URI: {frame_s3_path}")
-            
-            print(f"  → Downloading image: s3://{bucket}/{key}")
-            response = s3_client.get_object(Bucket=bucket, Key=key)
-            image_bytes = response['Body'].read()
-            
-            b64_image = base64.b64encode(image_bytes).decode('utf-8')
-            sm_payload = json.dumps({"image": b64_image})
-            
-            print(f"  → Calling SageMaker endpoint...")
-            sm_response = sm_runtime.invoke_endpoint(
-                EndpointName=ENDPOINT_NAME,
-                ContentType='application/json',
-                Body=sm_payload
-            )
-            
-            result_body = sm_response['Body'].read().decode('utf-8')
-            detection_results = json.loads(result_body)
-            
-            print(f"  → SM Raw Detections: {json.dumps(detection_results)}")
-            
-            detections = detection_results.get('detections', [])
-            num_detections = len(detections)
-            print(f"  → Received {num_detections} detection(s)")
-            
-            annotated_image_bytes = draw_boxes(image_bytes, detections)
-            
-            original_video_name = os.path.basename(original_video_key)
-            # Ensure ANNOTATED_PREFIX is clean
-            clean_annotated_prefix = ANNOTATED_PREFIX.strip('/')
-            
-            annotated_key_parts = [clean_annotated_prefix, original_video_name, frame_file] if clean_annotated_prefix else [original_video_name, frame_file]
-            annotated_key = str(PurePosixPath(*annotated_key_parts))
-            
-            print(f"  → Attempting to save annotated image to: s3://{ANNOTATED_BUCKET}/{annotated_key}")
-            s3_client.put_object(
-                Body=annotated_image_bytes,
-                Bucket=ANNOTATED_BUCKET,
-                Key=annotated_key,
-                ContentType='image/jpeg'
-            )
-            annotated_s3_uri = f"s3://{ANNOTATED_BUCKET}/{annotated_key}"
-            print(f"  → Saved annotated image to: {annotated_s3_uri}")
-
-            frame_number = extract_frame_number(frame_file)
-            
-            full_response_payload = {
-                "frame_id": f"{original_video_name}_frame_{frame_number:05d}",
-                "video_id": original_video_name,
-                "frame_number": frame_number,
-                "detections": detections,
-                "processed_frame_url": "N/A (Processed by SageMaker)",
-                "annotated_frame_s3_uri": annotated_s3_uri,
-                "outlier_detected": False,
-                "outlier_reason": None
-            }
-            
-            frame_json = frame_file.replace('.jpg', '.json').replace('.png', '.json')
-            
-            clean_output_prefix = OUTPUT_PREFIX.strip('/')
-            path_parts = [clean_output_prefix, original_video_name, frame_json] if clean_output_prefix else [original_video_name, frame_json]
-            result_key = str(PurePosixPath(*path_parts))
-            
-            print(f"  → Attempting to save JSON to: s3://{OUTPUT_BUCKET}/{result_key}")
-            s3_client.put_object(
-                Body=json.dumps(full_response_payload),
-                Bucket=OUTPUT_BUCKET,
-                Key=result_key,
-                ContentType='application/json'
-            )
-            
-            print(f"  ✓ Saved JSON to: s3://{OUTPUT_BUCKET}/{result_key}")
-            processed_count += 1
-            
-        except Exception as e:
-            error_msg = f"✗ ERROR processing {frame_file} from {original_video_key}: {str(e)}"
-            print(error_msg)
-            failed_messages.append({'itemIdentifier': record['messageId']})
+    failed_messages = _loop.run_until_complete(_amain(records)) if records else []
+    processed_count = len(records) - len(failed_messages)
     
-    print(f"\n{'='*60}")
-    print(f"Processed: {processed_count}/{len(event['Records'])} frames")
-    print(f"Failed: {len(failed_messages)} frames")
-    print(f"{'='*60}")
+    logger.info("Processed: %d/%d frames, failed: %d", processed_count, len(records), len(failed_messages))
     
     if failed_messages:
         return {'batchItemFailures': failed_messages}
@@ -215,3 +458,68 @@ def lambda_handler(event, context):
         'statusCode': 200,
         'body': json.dumps({'message': 'All frames processed successfully', 'processed': processed_count})
     }
+
+async def annotate_notification(record, s3):
+    """
+    Annotates the frame referenced by one async inference SNS success notification.
+    """
+    notification = json.loads(record['Sns']['Message'])
+    input_bucket, input_key = split_s3_location(notification['requestParameters']['inputLocation'])
+    output_bucket, output_key = split_s3_location(notification['responseParameters']['outputLocation'])
+    frame_file = os.path.basename(input_key)
+
+    logger.info("Annotating: %s (inference output: s3://%s/%s)", frame_file, output_bucket, output_key)
+
+    result_response = await s3.get_object(Bucket=output_bucket, Key=output_key)
+    detection_results = json.loads((await result_response['Body'].read()).decode('utf-8'))
+
+    frame = {
+        'frame_file': frame_file,
+        'original_video_key': os.path.dirname(input_key), # Its basename is the video name
+        'bucket': input_bucket,
+        'key': input_key
+    }
+    # The frame is only needed to draw boxes; frames without detections are copied server-side
+    if detection_results.get('detections'):
+        frame['image_bytes'] = await s3_get_parallel(s3, input_bucket, input_key)
+
+    await save_results(s3, frame, detection_results)
+
+async def _annotate_all(records):
+    """
+    Annotates all notifications concurrently. Returns the number of failures.
+    """
+    s3, _ = await get_clients()
+    results = await asyncio.gather(*(annotate_notification(record, s3) for record in records), return_exceptions=True)
+
+    failed_count = 0
+    for record, result in zip(records, results):
+        if isinstance(result, BaseException):
+            logger.error("✗ ERROR annotating notification %s: %s", record.get('Sns', {}).get('MessageId', 'unknown'), result)
+            failed_count += 1
+    return failed_count
+
+def annotation_handler(event, context):
+    """
+    Entry point of the annotation Lambda used with ASYNC_INFERENCE
+    (handler: SafeSite-Inference-Caller.annotation_handler).
+    Triggered by the async endpoint's SNS success notification: downloads the inference
+    output and the original frame, then draws boxes and saves results like the sync path.
+    Frames are expected at <prefix>/<video name>/<frame file>, as written by the frame extractor.
+    """
+    if not OUTPUT_BUCKET:
+        raise ValueError("Missing env var: OUTPUT_BUCKET")
+
+    records = event['Records']
+    logger.info("Received %d async inference notification(s).", len(records))
+
+    failed_count = _loop.run_until_complete(_annotate_all(records)) if records else 0
+
+    if failed_count:
+        # Fail the invocation so Lambda retries the notification
+        raise RuntimeError(f"Failed to annotate {failed_count}/{len(records)} frame(s)")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': 'All frames annotated successfully', 'processed': len(records)})
+    }
@@ -1,8 +1,9 @@
 import json
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 from urllib.parse import urlparse, unquote_plus # <-- Fixed typo: was 'uxnquote_plus'
 
 dynamodb = boto3.resource('dynamodb')
@@ -10,6 +11,12 @@ s3_client = boto3.client('s3')
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE', 'SafeSiteOutlierEvents')
 table = dynamodb.Table(TABLE_NAME)
 
+# GSIs with 'timestamp' as sort key (projection: ALL)
+VIDEO_INDEX_NAME = os.environ.get('VIDEO_INDEX_NAME', 'byTimestamp')  # Partition key: videoName
+ALL_INDEX_NAME = os.environ.get('ALL_INDEX_NAME', 'allByTimestamp')  # Partition key: eventPartition
+EVENT_PARTITION_ATTR = 'eventPartition'
+EVENT_PARTITION_ALL = 'ALL'  # Written on every item by SafeSite-outlier-detector
+
 
 class DecimalEncoder(json.JSONEncoder):
     """Helper class to convert Decimal to float for JSON serialization"""
@@ -70,53 +77,63 @@ def lambda_handler(event, context):
         
         print(f"Fetching outliers - limit: {limit}, video: {video_name}")
         
-        scan_kwargs = {'Limit': limit}
-        filter_expression = None
-        
+        # Newest-first GSI query: per video if filtered, otherwise the shared 'ALL' partition
         if video_name:
-            filter_expression = Attr('videoName').eq(video_name)
-        
-        if start_date:
-            start_filter = Attr('timestamp').gte(int(start_date))
-            filter_expression = start_filter if not filter_expression else filter_expression & start_filter
-        
-        if end_date:
-            end_filter = Attr('timestamp').lte(int(end_date))
-            filter_expression = end_filter if not filter_expression else filter_expression & end_filter
-        
-        if filter_expression:
-            scan_kwargs['FilterExpression'] = filter_expression
+            index_name = VIDEO_INDEX_NAME
+            key_condition = Key('videoName').eq(video_name)
+        else:
+            index_name = ALL_INDEX_NAME
+            key_condition = Key(EVENT_PARTITION_ATTR).eq(EVENT_PARTITION_ALL)
         
-        response = table.scan(**scan_kwargs)
-        items = response.get('Items', [])
+        if start_date and end_date:
+            key_condition = key_condition & Key('timestamp').between(int(start_date), int(end_date))
+        elif start_date:
+            key_condition = key_condition & Key('timestamp').gte(int(start_date))
+        elif end_date:
+            key_condition = key_condition & Key('timestamp').lte(int(end_date))
+
+        if start_date and end_date and int(start_date) > int(end_date):
+            # An empty range matches nothing (DynamoDB rejects BETWEEN with low > high)
+            items = []
+        else:
+            response = table.query(
+                IndexName=index_name,
+                KeyConditionExpression=key_condition,
+                ScanIndexForward=False,  # Descending by timestamp - newest first
+                Limit=limit
+            )
+            items = response.get('Items', [])
         
         # --- START OF FIX ---
         # Regenerate presigned URLs for *both* annotated and original images
-        for item in items:
+        # Collect (item index, field, bucket, key) first, then sign them all concurrently
+        tasks = []
+        for idx, item in enumerate(items):
             
             # 1. Try to get the ANNOTATED image URL
             annotated_s3_uri = item.get('annotated_frame_s3_uri')
             if annotated_s3_uri:
                 annotated_bucket, annotated_key = parse_s3_uri(annotated_s3_uri)
                 if annotated_bucket and annotated_key:
-                    new_annotated_url = regenerate_presigned_url(annotated_bucket, annotated_key)
-                    if new_annotated_url:
-                        # This is the field your React code looks for!
-                        item['presignedAnnotatedImageUrl'] = new_annotated_url
+                    # This is the field your React code looks for!
+                    tasks.append((idx, 'presignedAnnotatedImageUrl', annotated_bucket, annotated_key))
             
             # 2. Get the ORIGINAL image URL (as a fallback)
             s3_bucket = item.get('s3Bucket')
             s3_image_key = item.get('s3ImageKey')
             
             if s3_bucket and s3_image_key:
-                new_url = regenerate_presigned_url(s3_bucket, s3_image_key)
-                if new_url:
-                    item['presignedImageUrl'] = new_url
+                tasks.append((idx, 'presignedImageUrl', s3_bucket, s3_image_key))
+
+        if tasks:
+            with ThreadPoolExecutor(max_workers=min(8, len(tasks))) as executor:
+                urls = executor.map(lambda t: regenerate_presigned_url(t[2], t[3]), tasks)
+
+                for (idx, field, _, _), url in zip(tasks, urls):
+                    if url:
+                        items[idx][field] = url
         # --- END OF FIX ---
         
-        # Sort by timestamp (descending - newest first)
-        items.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-        
         return {
             'statusCode': 200,
             'headers': headers,
@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 import re
 import boto3
@@ -6,6 +7,21 @@ from datetime import datetime
 from urllib.parse import unquote_plus, urlparse
 from decimal import Decimal
 
+# Optional streaming JSON parser (bundled in the Lambda layer) for large inference results
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger()
+_log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# An unknown level name would make setLevel raise at import and fail every invocation
+if isinstance(logging.getLevelName(_log_level), int):
+    logger.setLevel(_log_level)
+else:
+    logger.setLevel(logging.INFO)
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", _log_level)
+
 # --- Clients ---
 s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
@@ -23,31 +39,35 @@ OUTLIER_CLASSES_STR = os.environ.get(
     'OUTLIER_CLASSES', 
     'tampering,intrusion,unauthorized_access,no_helmet,no_suit'
 )
-OUTLIER_CLASSES = {
+OUTLIER_CLASSES = frozenset(
     cls.strip().lower() for cls in OUTLIER_CLASSES_STR.split(',') if cls.strip()
-}
+)
 # --- END MODIFICATION ---
 
-print(f"Monitoring for outlier classes: {OUTLIER_CLASSES}")
+# Inference JSONs at least this large are stream-parsed (if ijson is available)
+STREAM_PARSE_MIN_BYTES = int(os.environ.get('STREAM_PARSE_MIN_BYTES', str(256 * 1024)))
+
+logger.info("Monitoring for outlier classes: %s", sorted(OUTLIER_CLASSES))
 if SNS_TOPIC_ARN:
-    print(f"SNS notifications enabled: {SNS_TOPIC_ARN}")
+    logger.info("SNS notifications enabled: %s", SNS_TOPIC_ARN)
 else:
-    print("⚠️  SNS notifications DISABLED - SNS_TOPIC_ARN not set")
+    logger.warning("⚠️  SNS notifications DISABLED - SNS_TOPIC_ARN not set")
+
+_FRAME_NUMBER_RE = re.compile(r'frame[_-]?(\d+)', re.IGNORECASE)
 
 
-def floats_to_decimals(obj):
+def to_decimal(value):
     """
-    Recursively converts all float values in a dict or list to Decimals.
+    Converts a float to Decimal, recursing into lists and dicts; other values are left untouched.
     Required because DynamoDB doesn't support Python float type.
     """
-    if isinstance(obj, list):
-        return [floats_to_decimals(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: floats_to_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, float):
-        return Decimal(str(obj))
-    else:
-        return obj
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, list):
+        return [to_decimal(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_decimal(v) for k, v in value.items()}
+    return value
 
 
 def extract_frame_number(frame_filename):
@@ -55,22 +75,131 @@ def extract_frame_number(frame_filename):
     Extract frame number from filename using regex.
     Handles: frame_00001.json, frame-00001.json, frame00001.json, etc.
     """
-    match = re.search(r'frame[_-]?(\d+)', frame_filename, re.IGNORECASE)
+    match = _FRAME_NUMBER_RE.search(frame_filename)
     if match:
         return int(match.group(1))
     return None
 
 
+def stream_inference_data(body):
+    """
+    Stream-parses an inference result, keeping only the fields used for outlier detection:
+    video_id, frame_number, processed_frame_url and label/confidence/bbox of each detection.
+    """
+    inference_data = {}
+    detection = None
+    field_builder = None # Builds a nested detection field (e.g. a bbox list) exactly like json.loads would
+
+    for prefix, event, value in ijson.parse(body, use_float=True):
+        if prefix == 'detections' and event == 'start_array':
+            inference_data['detections'] = []
+        elif prefix == 'detections.item':
+            if event == 'start_map':
+                detection = {}
+            elif event == 'end_map':
+                inference_data['detections'].append(detection)
+                detection = None
+        elif detection is not None and prefix.startswith('detections.item.'):
+            field = prefix.split('.', 3)[2]
+            if field not in ('label', 'confidence', 'bbox'):
+                continue
+            if field_builder is not None:
+                field_builder.event(event, value)
+                if prefix == f'detections.item.{field}' and event in ('end_map', 'end_array'):
+                    detection[field] = field_builder.value
+                    field_builder = None
+            elif event in ('start_map', 'start_array'):
+                field_builder = ijson.ObjectBuilder()
+                field_builder.event(event, value)
+            else:
+                # Scalars, including null, are kept as-is
+                detection[field] = value
+        elif prefix in ('video_id', 'frame_number', 'processed_frame_url') and event in ('string', 'number', 'null'):
+            inference_data[prefix] = value
+
+    return inference_data
+
+
+def read_inference_data(response):
+    """
+    Parses the inference result from an S3 GetObject response.
+    Large objects are streamed through ijson; small ones are cheaper with json.loads.
+    """
+    if ijson is not None and response.get('ContentLength', 0) >= STREAM_PARSE_MIN_BYTES:
+        try:
+            return stream_inference_data(response['Body'])
+        except ijson.JSONError as e:
+            # Surface malformed JSON the same way as the json.loads path
+            raise json.JSONDecodeError(f"Invalid JSON (ijson: {e})", '', 0) from e
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+
+def event_key(item):
+    """Primary key (partition key, sort key) of an outlier event item."""
+    return item['video_frame_timestamp'], item['timestamp']
+
+
+def save_outlier_events(items):
+    """
+    Writes outlier events with a DynamoDB batch writer (up to 25 items per request).
+    If a batch request fails (e.g. one invalid item), every item is retried with put_item
+    so each event still succeeds or fails on its own.
+    Returns the set of primary keys (see event_key) that were saved.
+    """
+    try:
+        # Deduplicate on the primary key so a repeated S3 event can't fail the whole batch
+        with table.batch_writer(overwrite_by_pkeys=['video_frame_timestamp', 'timestamp']) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        logger.info("✅ %d outlier event(s) saved to DynamoDB", len(items))
+        return {event_key(item) for item in items}
+    except Exception as e:
+        logger.warning("⚠️  Batch write of %d outlier event(s) failed (%s: %s); retrying one by one",
+                       len(items), type(e).__name__, e)
+
+    # Items already flushed by the batch writer are simply overwritten with the same data
+    saved_keys = set()
+    for item in items:
+        try:
+            table.put_item(Item=item)
+            saved_keys.add(event_key(item))
+            logger.info("✅ Outlier event saved to DynamoDB: %s", item['video_frame_timestamp'])
+        except Exception as e:
+            logger.exception("✗ ERROR: Failed to save outlier event %s to DynamoDB: %s: %s",
+                             item['video_frame_timestamp'], type(e).__name__, e)
+    return saved_keys
+
+
+def publish_alerts(entries):
+    """
+    Publishes queued SNS notifications with publish_batch (up to 10 messages per call).
+    Failures are logged only; notifications must not fail the function.
+    """
+    for start in range(0, len(entries), 10):
+        chunk = entries[start:start + 10]
+        try:
+            response = sns_client.publish_batch(TopicArn=SNS_TOPIC_ARN, PublishBatchRequestEntries=chunk)
+            for sent in response.get('Successful', []):
+                logger.info("✅ SNS notification sent: MessageId=%s", sent['MessageId'])
+            for failed in response.get('Failed', []):
+                logger.warning("⚠️  Failed to send SNS notification %s: %s", failed['Id'], failed.get('Message'))
+        except Exception as sns_error:
+            logger.exception("⚠️  Failed to send %d SNS notification(s): %s", len(chunk), sns_error)
+
+
 def lambda_handler(event, context):
     """
     Process inference results and detect outlier events.
-    Triggered by S3 PUT events on inference-results folder.
+    Triggered by S3 PUT events on inference-results folder
+    (notification filter: Prefix 'inference-results/', Suffix '.json').
     """
-    print(f"Received {len(event.get('Records', []))} S3 event(s)")
+    logger.info("Received %d S3 event(s)", len(event.get('Records', [])))
     
     processed_count = 0
     outlier_count = 0
     error_count = 0
+    items_to_save = []
+    sns_entries = []
 
     for record in event.get('Records', []):
         object_key = None
@@ -80,23 +209,20 @@ def lambda_handler(event, context):
             bucket_name = record['s3']['bucket']['name']
             object_key = unquote_plus(record['s3']['object']['key'])
 
-            print(f"\n{'='*60}")
-            print(f"Processing: s3://{bucket_name}/{object_key}")
+            logger.debug("Processing: s3://%s/%s", bucket_name, object_key)
 
-            # Filter: Only process inference results
-            if not object_key.startswith('inference-results/'):
-                print("⊘ Skipping: Not in inference-results folder")
-                continue
-                
-            if not object_key.endswith('.json'):
-                print("⊘ Skipping: Not a JSON file")
+            # Filter: Only process inference results (checked before any S3 read).
+            # The bucket notification should also filter on Prefix/Suffix so these never invoke us.
+            if not (object_key.startswith('inference-results/') and object_key.endswith('.json')):
+                logger.info("⊘ Skipping s3://%s/%s: Not a JSON file in inference-results folder", bucket_name, object_key)
                 continue
 
             # Read inference results from S3
             response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            inference_data = json.loads(response['Body'].read().decode('utf-8'))
+            inference_data = read_inference_data(response)
             
-            print(f"DEBUG: Inference data structure: {json.dumps(inference_data, indent=2)[:500]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Inference data structure: %s...", json.dumps(inference_data, indent=2)[:500])
 
             # --- 
             # FIX #1: The API returns 'detections', not 'predictions'
@@ -104,14 +230,14 @@ def lambda_handler(event, context):
             predictions = inference_data.get('detections', []) 
             
             if not isinstance(predictions, list):
-                print(f"⚠️  WARNING: 'detections' is not a list: {type(predictions)}")
+                logger.warning("⚠️  'detections' is not a list: %s", type(predictions))
                 predictions = []
 
             # Parse S3 key for metadata
             path_parts = object_key.split('/')
             
             if len(path_parts) < 3:
-                print(f"✗ Invalid S3 key structure. Expected at least 3 parts, got {len(path_parts)}")
+                logger.error("✗ Invalid S3 key structure. Expected at least 3 parts, got %d", len(path_parts))
                 error_count += 1
                 continue
             
@@ -119,39 +245,40 @@ def lambda_handler(event, context):
             # Use 'video_id' and 'frame_number' from the JSON if available,
             # as it's more reliable than parsing the filename.
             # ---
-            video_name = inference_data.get('video_id', path_parts[-2])
+            # videoName is a GSI partition key, so it must be a non-empty string
+            video_id = inference_data.get('video_id')
+            video_name = str(video_id) if video_id not in (None, '') else ''
+            video_name = video_name or path_parts[-2] or 'unknown-video'
             frame_filename = path_parts[-1]
             frame_number = inference_data.get('frame_number', extract_frame_number(frame_filename))
             
             if frame_number is None:
                 # Fallback if 'frame_number' isn't in JSON and filename parsing fails
-                print(f"✗ Could not determine frame number from JSON or filename: {frame_filename}")
+                logger.error("✗ Could not determine frame number from JSON or filename: %s", frame_filename)
                 error_count += 1
                 continue
 
-            print(f"→ Video: {video_name}")
-            print(f"→ Frame: {frame_number}")
-            print(f"→ Total detections: {len(predictions)}")
+            logger.debug("→ Video: %s, frame: %s, total detections: %d", video_name, frame_number, len(predictions))
 
             # Check for outliers
             detected_outliers = []
 
-            for idx, prediction in enumerate(predictions):
+            # Normalize labels to lowercase once; nothing to check if no outlier classes are configured
+            labels_lower = [str(p.get('label') or '').lower() for p in predictions] if OUTLIER_CLASSES else []
+
+            for idx, class_label_lower in enumerate(labels_lower):
                 # ---
                 # FIX #2: The API returns 'label', not 'class' or 'class_name'
                 # ---
-                class_label = prediction.get('label')
-                
-                if not class_label:
-                    print(f"  WARNING: Prediction {idx} missing 'label' field: {prediction}")
+                if not class_label_lower:
+                    logger.warning("Prediction %d missing 'label' field: %s", idx, predictions[idx])
                     continue
                 
-                # Normalize to lowercase for comparison
-                class_label_lower = str(class_label).lower()
-                
-                print(f"  → Checking class: '{class_label}' (normalized: '{class_label_lower}')")
+                logger.debug("  → Checking class: '%s' (normalized: '%s')", predictions[idx].get('label'), class_label_lower)
                 
                 if class_label_lower in OUTLIER_CLASSES:
+                    prediction = predictions[idx]
+                    class_label = prediction.get('label')
                     confidence = prediction.get('confidence', 0.0)
                     
                     # ---
@@ -159,17 +286,18 @@ def lambda_handler(event, context):
                     # ---
                     box = prediction.get('bbox', []) # Changed from 'box' and {} to []
                     
+                    # Stored as Decimals directly, ready for DynamoDB
                     detected_outliers.append({
                         'class': class_label,  # Store original case
-                        'confidence': confidence,
-                        'box': box
+                        'confidence': to_decimal(confidence),
+                        'box': to_decimal(box)  # May be None or nested; stored as received
                     })
                     
-                    print(f"    ⚠️  OUTLIER DETECTED: {class_label} (confidence: {confidence:.2f})")
+                    logger.info("    ⚠️  OUTLIER DETECTED in %s frame %s: %s (confidence: %.2f)", video_name, frame_number, class_label, confidence)
 
             # Save outliers to DynamoDB
             if detected_outliers:
-                print(f"\n🚨 OUTLIER EVENT: {len(detected_outliers)} anomaly(ies) detected!")
+                logger.info("🚨 OUTLIER EVENT: %d anomaly(ies) detected!", len(detected_outliers))
                 
                 event_id = f"{video_name}_{frame_filename.replace('.json', '')}"
                 current_timestamp = datetime.utcnow()
@@ -181,7 +309,7 @@ def lambda_handler(event, context):
                 
                 if not presigned_image_url or presigned_image_url == "N/A (Processed by SageMaker)":
                     # Fallback: manually generate presigned URL for the *original* frame
-                    print("  → No 'processed_frame_url' in JSON, generating presigned URL for original frame.")
+                    logger.debug("  → No 'processed_frame_url' in JSON, generating presigned URL for original frame.")
                     frame_image_key = object_key.replace('inference-results/', 'extracted-frames/').replace('.json', '.jpg')
                     try:
                         presigned_image_url = s3_client.generate_presigned_url(
@@ -189,12 +317,12 @@ def lambda_handler(event, context):
                             Params={'Bucket': bucket_name, 'Key': frame_image_key},
                             ExpiresIn=86400  # URL valid for 24 hours
                         )
-                        print(f"✓ Generated presigned URL for {frame_image_key}")
+                        logger.debug("✓ Generated presigned URL for %s", frame_image_key)
                     except Exception as e:
-                        print(f"✗ ERROR generating presigned URL for {frame_image_key}: {e}")
+                        logger.error("✗ ERROR generating presigned URL for %s: %s", frame_image_key, e)
                         presigned_image_url = f"Error generating URL: {e}"
                 else:
-                    print(f"✓ Using 'processed_frame_url' from API response: {presigned_image_url}")
+                    logger.debug("✓ Using 'processed_frame_url' from API response: %s", presigned_image_url)
                     # Try to parse the image key from the URL
                     try:
                         frame_image_key = unquote_plus(urlparse(presigned_image_url).path.lstrip('/'))
@@ -207,8 +335,9 @@ def lambda_handler(event, context):
                 item_to_save = {
                     'video_frame_timestamp': event_id,  # Partition Key
                     'timestamp': int(current_timestamp.timestamp()),  # Sort Key
+                    'eventPartition': 'ALL',  # GSI partition for "newest events" queries
                     'videoName': video_name,
-                    'frameNumber': frame_number,
+                    'frameNumber': to_decimal(frame_number),
                     's3Bucket': bucket_name,
                     's3Key': object_key,
                     's3ImageKey': frame_image_key,
@@ -219,14 +348,11 @@ def lambda_handler(event, context):
                     'timestampISO': current_timestamp.isoformat() + 'Z'
                 }
 
-                # Convert floats to Decimals for DynamoDB
-                item_with_decimals = floats_to_decimals(item_to_save)
+                # Queue for the batched DynamoDB write at the end of the invocation
+                items_to_save.append(item_to_save)
+                logger.debug("✅ Outlier event queued for DynamoDB: %s", event_id)
                 
-                # Save to DynamoDB
-                table.put_item(Item=item_with_decimals)
-                print(f"✅ Outlier event saved to DynamoDB: {event_id}")
-                
-                # --- Send SNS Notification ---
+                # --- Queue SNS Notification ---
                 if SNS_TOPIC_ARN:
                     try:
                         # Create notification message
@@ -260,13 +386,13 @@ Event ID: {event_id}
                             'sms': f"SafeSite Alert: {len(detected_outliers)} issue(s) in {video_name} frame {frame_number}. {outlier_summary}"
                         }
                         
-                        # Send notification
-                        response = sns_client.publish(
-                            TopicArn=SNS_TOPIC_ARN,
-                            Message=json.dumps(sns_message),
-                            MessageStructure='json',
-                            Subject=f'🚨 SafeSite Alert: {len(detected_outliers)} Safety Issue(s) Detected',
-                            MessageAttributes={
+                        # Queue notification, published in batches after the DynamoDB write
+                        sns_entries.append((event_key(item_to_save), {
+                            'Id': f"alert-{len(sns_entries)}",
+                            'Message': json.dumps(sns_message),
+                            'MessageStructure': 'json',
+                            'Subject': f'🚨 SafeSite Alert: {len(detected_outliers)} Safety Issue(s) Detected',
+                            'MessageAttributes': {
                                 'eventType': {
                                     'DataType': 'String',
                                     'StringValue': 'outlier_detection'
@@ -280,46 +406,47 @@ Event ID: {event_id}
                                     'StringValue': video_name
                                 }
                             }
-                        )
-                        
-                        print(f"✅ SNS notification sent: MessageId={response['MessageId']}")
+                        }))
                         
                     except Exception as sns_error:
-                        print(f"⚠️  WARNING: Failed to send SNS notification: {sns_error}")
-                        import traceback
-                        print(traceback.format_exc())
+                        logger.exception("⚠️  Failed to prepare SNS notification: %s", sns_error)
                         # Don't fail the entire function if notification fails
                 else:
-                    print("⊘ SNS notification skipped - SNS_TOPIC_ARN not configured")
+                    logger.debug("⊘ SNS notification skipped - SNS_TOPIC_ARN not configured")
                 
                 outlier_count += 1
             else:
-                print("✓ No outliers detected")
+                logger.debug("✓ No outliers detected")
 
             processed_count += 1
 
         except KeyError as e:
-            print(f"✗ ERROR: Missing expected field in event structure: {e}")
-            print(f"  Event record: {json.dumps(record, default=str)[:500]}")
+            logger.error("✗ ERROR: Missing expected field in event structure: %s", e)
+            logger.error("  Event record: %s", json.dumps(record, default=str)[:500])
             error_count += 1
             
         except json.JSONDecodeError as e:
-            print(f"✗ ERROR: Invalid JSON in S3 object {object_key}: {e}")
+            logger.error("✗ ERROR: Invalid JSON in S3 object %s: %s", object_key, e)
             error_count += 1
             
         except Exception as e:
-            print(f"✗ ERROR: Unexpected error processing {object_key}: {type(e).__name__}: {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("✗ ERROR: Unexpected error processing %s: %s: %s", object_key, type(e).__name__, e)
             error_count += 1
 
+    # As before, an event that can't be stored counts as an error and gets no alert
+    if items_to_save:
+        saved_keys = save_outlier_events(items_to_save)
+        failed_saves = sum(1 for item in items_to_save if event_key(item) not in saved_keys)
+        processed_count -= failed_saves
+        outlier_count -= failed_saves
+        error_count += failed_saves
+
+        alerts = [entry for key, entry in sns_entries if key in saved_keys]
+        if alerts:
+            publish_alerts(alerts)
+
     # Summary
-    print(f"\n{'='*60}")
-    print(f"SUMMARY:")
-    print(f"  Processed: {processed_count}")
-    print(f"  Outliers detected: {outlier_count}")
-    print(f"  Errors: {error_count}")
-    print(f"{'='*60}")
+    logger.info("SUMMARY: processed: %d, outliers detected: %d, errors: %d", processed_count, outlier_count, error_count)
 
     return {
         'statusCode': 200,